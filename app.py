@@ -1,12 +1,39 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import cv2
+import xlsxwriter
 import pytesseract
-from pdf2image import convert_from_bytes
+from pytesseract import Output
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
 from PIL import Image
+from rapidfuzz import fuzz
+import hashlib
 import io
+import os
 import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
+try:
+    import pymupdf as fitz  # PyMuPDF - renders in-process, no Poppler subprocess
+except ImportError:
+    try:
+        import fitz  # Older PyMuPDF releases only ship the fitz name
+    except ImportError:
+        fitz = None
+
+try:
+    from tesserocr import PyTessBaseAPI, PSM, OEM, RIL, iterate_level  # Tesseract C-API, no subprocess per page
+except ImportError:
+    PyTessBaseAPI = None
+
 # ===========================
 # CONFIGURATION
 # ===========================
@@ -34,143 +61,716 @@ EXAM_QUESTIONS = {
 
 GARBAGE_CHARS = set('!@#$%^&*()[]{}|\\/<>~`')
 GARBAGE_THRESHOLD = 0.3
+# Answers whose OCR'd words average below this Tesseract confidence are SUSPECT_OCR
+OCR_MIN_CONF = 60
+_GARBAGE_TRANS = str.maketrans('', '', ''.join(GARBAGE_CHARS))
+
+PAGE_BREAK = "\n\n=== PAGE BREAK ===\n\n"
+
+# Render at OCR_DPI first; pages behind SUSPECT_OCR answers are rescanned at OCR_RETRY_DPI
+OCR_DPI = 200
+OCR_RETRY_DPI = 400
+
+# Minimum RapidFuzz partial-ratio score for a garbled marker to count as found
+MARKER_FUZZY_MIN_SCORE = 75
+
+# Without tesserocr, up to this many pages are stacked into one image per tesseract
+# call (one model load instead of one per page), separated by OCR_PAGE_GAP white rows
+OCR_BATCH_PAGES = 4
+OCR_PAGE_GAP = 100
+
+# Pages with less than this fraction of dark pixels are treated as blank and not OCR'd
+OCR_BLANK_MAX_INK = 0.0002
+
+# Pages whose embedded text layer has more than this many characters skip OCR
+DIGITAL_TEXT_MIN_CHARS = 100
+# ...unless they carry annotations (e.g. tablet ink) or an image covering this much of the page
+DIGITAL_MAX_IMAGE_AREA = 0.1
+
+# Denoise before binarizing - slower, but cleaner input for handwritten pages
+OCR_DENOISE = True
+
+# Header words below this Tesseract confidence are ignored for name/reg extraction
+HEADER_MIN_CONF = 50
+
+# Name/registration patterns for the script header, tried in order
+_NAME_PATTERNS = [re.compile(p, re.MULTILINE) for p in (
+    r'[Nn]ame\s*:?\s*([A-Za-z][A-Za-z\s\.]+?)(?:\n|[Rr]eg|$)',
+    r'Student\s*[Nn]ame\s*:?\s*([A-Za-z][A-Za-z\s\.]+?)(?:\n|[Rr]eg|$)',
+    r'^\s*([A-Z][a-z]+\s+[A-Z][a-z]+)',  # Capitalized words at start
+)]
+_REG_PATTERNS = [re.compile(p) for p in (
+    r'[Rr]eg(?:istration)?\s*[Nn]o?\.?\s*:?\s*([0-9]+)',
+    r'[Rr]oll\s*[Nn]o?\.?\s*:?\s*([0-9]+)',
+    r'[Ii][Dd]\s*:?\s*([0-9]+)',
+    r'\b([0-9]{6,10})\b',  # Any 6-10 digit number
+)]
+_NAME_CLEAN_RE = re.compile(r'[^A-Za-z\s\.]')
+_NAME_LABEL_RE = re.compile(r'^(?:student)?name\b\W*(.*)$', re.IGNORECASE)
+_REG_LABEL_RE = re.compile(r'^(?:reg(?:istration)?|roll|id)\b', re.IGNORECASE)
+_NON_DIGIT_RE = re.compile(r'\D')
+
+# OCR results (whole PDFs and single-page rescans) kept in memory across reruns
+OCR_CACHE_MAX_ENTRIES = 256
+
+# Worker processes for per-page OCR (set OCR_MAX_WORKERS=1 on small containers)
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', os.cpu_count() or 1))
+
+# Marksheet column order: base info, then these fields per question, then total
+BASE_COLUMNS = ['script_name', 'name_raw', 'reg_raw', 'name_clean', 'reg_clean',
+                'id_status', 'script_status']
+QUESTION_FIELDS = ['final_score', 'ai_score', 'ocr_status', 'ocr_flag', 'ai_status', 'ai_flag']
+MARKSHEET_COLUMNS = (BASE_COLUMNS
+                     + [f'{q}_{f}' for q in EXAM_QUESTIONS for f in QUESTION_FIELDS]
+                     + ['total_score'])
+
+# ===========================
+# RESULT TYPES
+# ===========================
+
+@dataclass
+class QuestionResult:
+    """Grading outcome for one question of one script"""
+    final_score: Optional[float]
+    ai_score: Optional[float]
+    ocr_status: str
+    ocr_flag: str
+    ai_status: str
+    ai_flag: str
+
+@dataclass
+class ScriptResult:
+    """Grading outcome for one script"""
+    script_name: str
+    name_raw: Optional[str] = None
+    reg_raw: Optional[str] = None
+    name_clean: Optional[str] = None
+    reg_clean: Optional[str] = None
+    id_status: Optional[str] = None
+    script_status: Optional[str] = None
+    total_score: float = 0
+    questions: Dict[str, QuestionResult] = field(default_factory=dict)
+
+def results_to_columns(results):
+    """Flatten ScriptResults into marksheet columns (MARKSHEET_COLUMNS order)"""
+    columns = {col: [] for col in MARKSHEET_COLUMNS}
+    for result in results:
+        for col in BASE_COLUMNS:
+            columns[col].append(getattr(result, col))
+        for q in EXAM_QUESTIONS:
+            q_result = result.questions.get(q)
+            for f in QUESTION_FIELDS:
+                columns[f'{q}_{f}'].append(getattr(q_result, f) if q_result else None)
+        columns['total_score'].append(result.total_score)
+    return columns
 
 # ===========================
 # HELPER FUNCTIONS
 # ===========================
 
-def extract_text_from_pdf(pdf_bytes):
-    """Convert PDF to images and OCR all pages"""
+_TESS_LOCAL = threading.local()
+
+def get_tess_api():
+    """Per-thread tesserocr handle, so the model is loaded once per thread/worker"""
+    api = getattr(_TESS_LOCAL, 'api', None)
+    if api is None:
+        api = _TESS_LOCAL.api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK, oem=OEM.LSTM_ONLY)
+    return api
+
+def tesserocr_available():
+    """True if tesserocr is installed and can start (e.g. it finds its tessdata)"""
+    global PyTessBaseAPI
+    if PyTessBaseAPI is None:
+        return False
     try:
-        images = convert_from_bytes(pdf_bytes, dpi=300)
-        full_text = ""
-        for img in images:
-            # Use better OCR config for handwriting
-            text = pytesseract.image_to_string(img, config='--psm 6 --oem 3')
-            full_text += text + "\n\n=== PAGE BREAK ===\n\n"
-        return full_text, images[0] if images else None
+        get_tess_api()
+        return True
     except Exception as e:
-        return None, None
+        # Fall back to pytesseract for the rest of this process
+        PyTessBaseAPI = None
+        return False
 
-def extract_name_reg_from_top(first_page_img):
-    """Extract name and reg from top 25% of first page"""
-    if first_page_img is None:
-        return None, None, "NO_IMAGE"
+def preprocess_image(img):
+    """Grayscale (and denoise) then Otsu-binarize an image for OCR, as a uint8 array"""
+    arr = np.asarray(img.convert('L'))
+    if OCR_DENOISE:
+        arr = cv2.fastNlMeansDenoising(arr, h=10)
+    _, bw = cv2.threshold(arr, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return bw
+
+# Word-level OCR output: one list per key, one entry per word (like pytesseract's Output.DICT)
+WORD_KEYS = ('text', 'conf', 'left', 'top', 'width', 'height', 'block_num', 'par_num', 'line_num')
+
+def _tess_words(api):
+    """Collect word boxes from a tesserocr handle after SetImageBytes"""
+    data = {key: [] for key in WORD_KEYS}
+    api.Recognize()
+    iterator = api.GetIterator()
+    if iterator is None:
+        return data
+    block = par = line = 0
+    for word in iterate_level(iterator, RIL.WORD):
+        if word.IsAtBeginningOf(RIL.BLOCK):
+            block, par, line = block + 1, 0, 0
+        if word.IsAtBeginningOf(RIL.PARA):
+            par, line = par + 1, 0
+        if word.IsAtBeginningOf(RIL.TEXTLINE):
+            line += 1
+        text = (word.GetUTF8Text(RIL.WORD) or '').strip()
+        if not text:
+            continue
+        x1, y1, x2, y2 = word.BoundingBox(RIL.WORD)
+        for key, value in zip(WORD_KEYS, (text, word.Confidence(RIL.WORD), x1, y1,
+                                          x2 - x1, y2 - y1, block, par, line)):
+            data[key].append(value)
+    return data
+
+def ocr_image_data(img, psm=6, dpi=OCR_DPI):
+    """OCR a page or crop rendered at dpi into word boxes (see WORD_KEYS)"""
+    arr = preprocess_image(img)
+    if tesserocr_available():
+        api = get_tess_api()
+        api.SetPageSegMode(psm)
+        try:
+            # Hand tesseract the raw 8-bit pixels; SetImage(PIL) would encode a temporary image first
+            height, width = arr.shape
+            api.SetImageBytes(arr.tobytes(), width, height, 1, width)
+            # Raw bytes carry no resolution; without it tesseract assumes 70 DPI
+            api.SetSourceResolution(dpi)
+            return _tess_words(api)
+        finally:
+            api.SetPageSegMode(PSM.SINGLE_BLOCK)
+    
+    return _pytesseract_words(arr, psm, dpi)
+
+def _pytesseract_words(arr, psm=6, dpi=OCR_DPI):
+    """Word boxes for an already preprocessed image array via the tesseract CLI"""
+    # Use better OCR config for handwriting
+    raw = pytesseract.image_to_data(Image.fromarray(arr), config=f'--psm {psm} --oem 3 --dpi {dpi}', output_type=Output.DICT)
+    keep = [i for i, (level, text) in enumerate(zip(raw['level'], raw['text']))
+            if level == 5 and text.strip()]
+    data = {key: [raw[key][i] for i in keep] for key in WORD_KEYS}
+    data['conf'] = [float(c) for c in data['conf']]
+    return data
+
+def ocr_stacked_pages(images, dpi=OCR_DPI):
+    """OCR several pages with one tesseract call by stacking them vertically.
+    
+    Returns one word-box dict per page; words are assigned back to their
+    page by their top coordinate, which is made page-relative again.
+    """
+    pages = [preprocess_image(img) for img in images]
+    sheet = np.full((sum(page.shape[0] for page in pages) + OCR_PAGE_GAP * (len(pages) - 1),
+                     max(page.shape[1] for page in pages)), 255, dtype=np.uint8)
+    offsets = []
+    y = 0
+    for page in pages:
+        height, width = page.shape
+        sheet[y:y + height, :width] = page
+        offsets.append(y)
+        y += height + OCR_PAGE_GAP
+    
+    data = _pytesseract_words(sheet, dpi=dpi)
+    per_page = [{key: [] for key in WORD_KEYS} for _ in pages]
+    for i, top in enumerate(data['top']):
+        idx = bisect_right(offsets, top) - 1
+        for key in WORD_KEYS:
+            per_page[idx][key].append(data[key][i])
+        per_page[idx]['top'][-1] -= offsets[idx]
+    return per_page
+
+def is_blank_page(img):
+    """True if a rendered page has (almost) no ink on it"""
+    gray = np.asarray(img.convert('L'))
+    return np.count_nonzero(gray < 128) < OCR_BLANK_MAX_INK * gray.size
+
+def ocr_page_images(images, dpi=OCR_DPI):
+    """OCR rendered pages into one word-box dict per page (blank pages get no words)"""
+    data = [{key: [] for key in WORD_KEYS} for _ in images]
+    inked = [i for i, img in enumerate(images) if not is_blank_page(img)]
+    if tesserocr_available() or len(inked) == 1:
+        for i in inked:
+            data[i] = ocr_image_data(images[i], dpi=dpi)
+    elif inked:
+        for i, page_data in zip(inked, ocr_stacked_pages([images[i] for i in inked], dpi)):
+            data[i] = page_data
+    return data
+
+def layout_words(data):
+    """Lay word boxes out as plain text: one line per OCR line, blank line between paragraphs.
     
+    Returns (text, starts) where starts[i] is the character offset of word i in text.
+    """
+    parts = []
+    starts = []
+    pos = 0
+    prev = None
+    for i, word in enumerate(data['text']):
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if prev is None:
+            sep = ''
+        elif key == prev:
+            sep = ' '
+        elif key[:2] != prev[:2]:
+            sep = '\n\n'
+        else:
+            sep = '\n'
+        pos += len(sep)
+        starts.append(pos)
+        parts.append(sep + word)
+        pos += len(word)
+        prev = key
+    return ''.join(parts), starts
+
+def data_to_text(data):
+    """Rebuild plain text from word boxes"""
+    return layout_words(data)[0]
+
+def header_words(data, max_top):
+    """Confident words starting above max_top pixels"""
+    keep = [i for i, (top, conf) in enumerate(zip(data['top'], data['conf']))
+            if top < max_top and conf >= HEADER_MIN_CONF]
+    return {key: [data[key][i] for i in keep] for key in WORD_KEYS}
+
+def extract_digital_text(page):
+    """Return a PyMuPDF page's embedded text if it is born-digital, else None"""
+    # Handwriting over a printed template lives in annotations or scanned images
+    if page.first_annot is not None:
+        return None
+    page_area = abs(page.rect)
+    if any(abs(page.rect & fitz.Rect(info['bbox'])) > DIGITAL_MAX_IMAGE_AREA * page_area
+           for info in page.get_image_info()):
+        return None
+    text = page.get_text("text")
+    if len(text.strip()) > DIGITAL_TEXT_MIN_CHARS and any(c.isalpha() for c in text):
+        return text
+    return None
+
+def extract_digital_header(pdf_bytes):
+    """Return embedded text from the top 25% of page 1, if any"""
+    if fitz is None:
+        return None
     try:
-        width, height = first_page_img.size
-        top_portion = first_page_img.crop((0, 0, width, int(height * 0.25)))
-        text = pytesseract.image_to_string(top_portion, config='--psm 6')
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            if doc.page_count == 0:
+                return None
+            page = doc[0]
+            cutoff = page.rect.height * 0.25
+            # Blocks are (x0, y0, x1, y1, text, block_no, block_type)
+            lines = [b[4] for b in page.get_text("blocks") if b[6] == 0 and b[1] < cutoff]
+            text = "\n".join(lines)
+            return text if text.strip() else None
+    except Exception as e:
+        return None
+
+def open_pdf(pdf_bytes):
+    """Open a PDF with PyMuPDF (a no-op context when falling back to pdf2image)"""
+    if fitz is None:
+        return nullcontext()
+    return fitz.open(stream=pdf_bytes, filetype="pdf")
+
+def classify_pdf_pages(pdf_bytes, doc, first_page=None, last_page=None):
+    """Return (page_numbers, digital_texts) for a 1-based page range.
+    
+    digital_texts maps page number -> embedded text for born-digital pages;
+    every other page needs OCR.
+    """
+    page_count = doc.page_count if doc is not None else pdfinfo_from_bytes(pdf_bytes)['Pages']
+    start = first_page or 1
+    stop = min(last_page or page_count, page_count)
+    page_numbers = list(range(start, stop + 1))
+    
+    digital_texts = {}
+    if doc is not None:
+        for page_num in page_numbers:
+            text = extract_digital_text(doc[page_num - 1])
+            if text is not None:
+                digital_texts[page_num] = text
+    return page_numbers, digital_texts
+
+def render_page(pdf_bytes, doc, page_num, dpi=OCR_DPI):
+    """Render one 1-based PDF page to a PIL image"""
+    if doc is None:
+        return convert_from_bytes(pdf_bytes, dpi=dpi, first_page=page_num, last_page=page_num)[0]
+    zoom = dpi / 72
+    pix = doc[page_num - 1].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+# Per-worker PDF state, set once by _init_ocr_worker
+_WORKER_PDF = {}
+
+def _init_ocr_worker(pdf_bytes, dpi):
+    """Process pool initializer: load the Tesseract model and open the PDF once per worker"""
+    tesserocr_available()
+    _WORKER_PDF['bytes'] = pdf_bytes
+    _WORKER_PDF['doc'] = fitz.open(stream=pdf_bytes, filetype="pdf") if fitz is not None else None
+    _WORKER_PDF['dpi'] = dpi
+
+def _ocr_page_batch(page_numbers):
+    """Render and OCR a batch of pages into word boxes (process pool worker)"""
+    images = [render_page(_WORKER_PDF['bytes'], _WORKER_PDF['doc'], page_num, _WORKER_PDF['dpi'])
+              for page_num in page_numbers]
+    return ocr_page_images(images, _WORKER_PDF['dpi'])
+
+def iter_page_ocr(pdf_bytes, doc, page_numbers, dpi=OCR_DPI, max_workers=OCR_MAX_WORKERS,
+                  first_page_img=None):
+    """Yield (page_num, word_boxes), rendering pages only when they are OCR'd"""
+    # tesserocr keeps its model loaded, so pages are only batched for the CLI fallback
+    batch_size = 1 if tesserocr_available() else OCR_BATCH_PAGES
+    parallel = max_workers > 1 and len(page_numbers) > 1
+    if parallel:
+        # Keep every worker busy rather than filling the first batches
+        workers = min(max_workers, len(page_numbers))
+        batch_size = min(batch_size, -(-len(page_numbers) // workers))
+    batches = [page_numbers[i:i + batch_size] for i in range(0, len(page_numbers), batch_size)]
+    
+    if parallel:
+        # Workers render their own pages, so only page numbers cross the process boundary
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                                 initargs=(pdf_bytes, dpi)) as executor:
+            for batch, batch_data in zip(batches, executor.map(_ocr_page_batch, batches)):
+                yield from zip(batch, batch_data)
+        return
+    
+    for batch in batches:
+        images = [first_page_img if page_num == 1 and first_page_img is not None
+                  else render_page(pdf_bytes, doc, page_num, dpi)
+                  for page_num in batch]
+        yield from zip(batch, ocr_page_images(images, dpi))
+
+def extract_text_from_pdf(pdf_bytes, dpi=OCR_DPI, first_page=None, last_page=None,
+                          max_workers=OCR_MAX_WORKERS):
+    """OCR all pages of a PDF (or a 1-based page range), one page at a time.
+    
+    Returns (full_text, first_page_jpeg, first_page_header_words, page_confs).
+    The header words come from page 1's OCR pass so name/reg needs no second
+    pass. page_confs maps each OCR'd page to (word_offsets, word_confs) within
+    that page's text; born-digital pages have no entry. Only page text is
+    accumulated - page images are dropped as soon as they are OCR'd. Page 1
+    is returned as JPEG bytes only for whole-document calls where it was not
+    OCR'd (born-digital), since then its header must be OCR'd from the image.
+    Blank pages are not OCR'd and come back empty.
+    """
+    try:
+        with open_pdf(pdf_bytes) as doc:
+            page_numbers, texts = classify_pdf_pages(pdf_bytes, doc, first_page, last_page)
+            ocr_pages = [n for n in page_numbers if n not in texts]
+            
+            first_page_img = render_page(pdf_bytes, doc, 1, dpi) if 1 in page_numbers else None
+            page_data = dict(iter_page_ocr(pdf_bytes, doc, ocr_pages, dpi, max_workers,
+                                           first_page_img))
+            header = None
+            page_confs = {}
+            for page_num, data in page_data.items():
+                texts[page_num], offsets = layout_words(data)
+                page_confs[page_num] = (offsets, data['conf'])
+                if page_num == 1:
+                    header = header_words(data, first_page_img.size[1] * 0.25)
         
-        # Try multiple patterns for name
-        name = None
-        name_patterns = [
-            r'[Nn]ame\s*:?\s*([A-Za-z][A-Za-z\s\.]+?)(?:\n|[Rr]eg|$)',
-            r'Student\s*[Nn]ame\s*:?\s*([A-Za-z][A-Za-z\s\.]+?)(?:\n|[Rr]eg|$)',
-            r'^\s*([A-Z][a-z]+\s+[A-Z][a-z]+)',  # Capitalized words at start
-        ]
+        full_text = "".join(texts[n] + PAGE_BREAK for n in page_numbers)
+        first_page_jpeg = None
+        if first_page is None and header is None and first_page_img is not None:
+            first_page_jpeg = to_jpeg(first_page_img)
+        return full_text, first_page_jpeg, header, page_confs
+    except Exception as e:
+        return None, None, None, None
+
+def to_jpeg(img, quality=85):
+    """Compress a page image to JPEG bytes, which are far cheaper to cache than a PIL image"""
+    buf = io.BytesIO()
+    img.convert('RGB').save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+def content_hash(data):
+    """Short, stable cache key for a blob of bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def _ocr_cache():
+    """Process-wide OCR results shared by all sessions and reruns, with its lock"""
+    return OrderedDict(), threading.Lock()
+
+def cache_lookup(key):
+    """Cached OCR result for key (a PDF hash, or (hash, page) for rescans), else None"""
+    cache, lock = _ocr_cache()
+    with lock:
+        if key not in cache:
+            return None
+        cache.move_to_end(key)
+        return cache[key]
+
+def cache_store(key, result):
+    """Cache an OCR result, evicting the least recently used beyond OCR_CACHE_MAX_ENTRIES.
+    
+    Failed OCR (no text) is not stored, so it is retried on the next run.
+    """
+    if result[0] is None:
+        return
+    cache, lock = _ocr_cache()
+    with lock:
+        cache[key] = result
+        cache.move_to_end(key)
+        while len(cache) > OCR_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+def ocr_pdf(pdf_hash, pdf_bytes, max_workers=OCR_MAX_WORKERS):
+    """OCR a whole PDF once per content hash.
+    
+    Returns (full_text, first_page_jpeg, header_words, page_confs).
+    """
+    result = cache_lookup(pdf_hash)
+    if result is None:
+        result = extract_text_from_pdf(pdf_bytes, max_workers=max_workers)
+        cache_store(pdf_hash, result)
+    return result
+
+def ocr_retry_page(pdf_bytes, page_num):
+    """OCR a single page at OCR_RETRY_DPI -> (text, confs)"""
+    text, _, _, page_confs = extract_text_from_pdf(pdf_bytes, dpi=OCR_RETRY_DPI,
+                                                   first_page=page_num, last_page=page_num)
+    return text, (page_confs or {}).get(page_num)
+
+def rescan_page(pdf_hash, pdf_bytes, page_num):
+    """ocr_retry_page, once per content hash and page"""
+    result = cache_lookup((pdf_hash, page_num))
+    if result is None:
+        result = ocr_retry_page(pdf_bytes, page_num)
+        cache_store((pdf_hash, page_num), result)
+    return result
+
+def rescan_pages(pdf_hash, pdf_bytes, full_text, page_numbers, page_confs):
+    """Re-OCR the given 1-based pages at OCR_RETRY_DPI and splice them into full_text.
+    
+    page_confs is updated in place with the rescanned pages' word confidences.
+    Pages that were not OCR'd (born-digital or skipped) are left as they are.
+    """
+    pages = full_text.split(PAGE_BREAK)
+    for page_num in sorted(page_numbers):
+        if page_num not in page_confs:
+            continue
+        text, confs = rescan_page(pdf_hash, pdf_bytes, page_num)
+        if text is not None:
+            pages[page_num - 1] = text[:-len(PAGE_BREAK)]
+            if confs is not None:
+                page_confs[page_num] = confs
+    return PAGE_BREAK.join(pages)
+
+def mean_confidence(full_text, page_confs, span):
+    """Mean Tesseract confidence of the OCR'd words inside a full_text span (None if none)"""
+    if span is None:
+        return None
+    start, end = span[0], span[1]
+    confs = []
+    page_start = 0
+    for page_num, page_text in enumerate(full_text.split(PAGE_BREAK), start=1):
+        page_end = page_start + len(page_text)
+        if page_start < end and page_end > start and page_num in page_confs:
+            offsets, page_word_confs = page_confs[page_num]
+            lo = bisect_left(offsets, start - page_start)
+            hi = bisect_left(offsets, end - page_start)
+            confs.extend(c for c in page_word_confs[lo:hi] if c >= 0)
+        page_start = page_end + len(PAGE_BREAK)
+    return float(np.mean(confs)) if confs else None
+
+def find_answer_pages(full_text, span):
+    """Return the 1-based page numbers an answer's span covers"""
+    start, end = span[0], span[1]
+    # full_text ends with a PAGE_BREAK, so a span running to the end must not count it
+    page_count = full_text.count(PAGE_BREAK)
+    first = min(full_text.count(PAGE_BREAK, 0, start) + 1, page_count)
+    last = min(full_text.count(PAGE_BREAK, 0, end) + 1, page_count)
+    return set(range(first, last + 1))
+
+def parse_name_reg(text):
+    """Find name and reg in header text"""
+    # Try multiple patterns for name
+    name = None
+    for pattern in _NAME_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            name = match.group(1).strip()
+            # Clean up common OCR errors
+            name = _NAME_CLEAN_RE.sub('', name)
+            if len(name) > 3:
+                break
+    
+    # Try multiple patterns for registration
+    reg = None
+    for pattern in _REG_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            reg = match.group(1).strip()
+            if len(reg) >= 4:
+                break
+    
+    return name, reg, id_status(name, reg)
+
+def id_status(name, reg):
+    """Status of an extracted name/reg pair"""
+    if name and reg:
+        return "OK"
+    elif name or reg:
+        return "PARTIAL"
+    return "NEEDS_MANUAL_FIX"
+
+def parse_name_reg_from_words(data):
+    """Find name and reg by looking right of their labels on the same OCR line"""
+    name = None
+    reg = None
+    words = data['text']
+    lines = list(zip(data['block_num'], data['par_num'], data['line_num']))
+    
+    for i, word in enumerate(words):
+        label = _NAME_LABEL_RE.match(word)
+        is_reg_label = _REG_LABEL_RE.match(word)
+        if not label and not is_reg_label:
+            continue
+        following = [j for j in range(i + 1, len(words)) if lines[j] == lines[i]]
         
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.MULTILINE)
-            if match:
-                name = match.group(1).strip()
-                # Clean up common OCR errors
-                name = re.sub(r'[^A-Za-z\s\.]', '', name)
-                if len(name) > 3:
+        if name is None and label:
+            parts = [label.group(1)] if label.group(1) else []
+            for j in following:
+                # Stop at the next field: a reg label, any "Label:" word, or digits
+                if (_REG_LABEL_RE.match(words[j]) or words[j].endswith(':')
+                        or any(c.isdigit() for c in words[j])):
                     break
+                parts.append(words[j])
+            candidate = _NAME_CLEAN_RE.sub('', ' '.join(parts)).strip()
+            if len(candidate) > 3:
+                name = candidate
         
-        # Try multiple patterns for registration
-        reg = None
-        reg_patterns = [
-            r'[Rr]eg(?:istration)?\s*[Nn]o?\.?\s*:?\s*([0-9]+)',
-            r'[Rr]oll\s*[Nn]o?\.?\s*:?\s*([0-9]+)',
-            r'[Ii][Dd]\s*:?\s*([0-9]+)',
-            r'\b([0-9]{6,10})\b',  # Any 6-10 digit number
-        ]
-        
-        for pattern in reg_patterns:
-            match = re.search(pattern, text)
-            if match:
-                reg = match.group(1).strip()
-                if len(reg) >= 4:
+        elif reg is None and is_reg_label:
+            for j in [i] + following:
+                digits = _NON_DIGIT_RE.sub('', words[j])
+                if len(digits) >= 4:
+                    reg = digits
                     break
+    
+    return name, reg
+
+def extract_name_reg_from_top(first_page_jpeg, header_text=None, header_data=None):
+    """Extract name and reg from top 25% of first page"""
+    # Born-digital header: no OCR needed
+    digital = parse_name_reg(header_text) if header_text else None
+    if digital and digital[2] == "OK":
+        return digital
+    
+    try:
+        if header_data is None:
+            if first_page_jpeg is None:
+                return digital if digital else (None, None, "NO_IMAGE")
+            # Page 1 wasn't OCR'd (born-digital) - OCR just the header as a single column
+            first_page_img = Image.open(io.BytesIO(first_page_jpeg))
+            width, height = first_page_img.size
+            top_portion = first_page_img.crop((0, 0, width, int(height * 0.25)))
+            header_data = header_words(ocr_image_data(top_portion, psm=4), top_portion.size[1])
         
-        # Determine status
+        name, reg = parse_name_reg_from_words(header_data)
         if name and reg:
-            status = "OK"
-        elif name or reg:
-            status = "PARTIAL"
-        else:
-            status = "NEEDS_MANUAL_FIX"
+            return name, reg, "OK"
         
-        return name, reg, status
+        # Fall back to line regexes, keeping whatever the text layer did find
+        text = data_to_text(header_data)
+        if header_text:
+            text = header_text + "\n" + text
+        text_name, text_reg, _ = parse_name_reg(text)
+        name = name or text_name
+        reg = reg or text_reg
+        return name, reg, id_status(name, reg)
     except Exception as e:
-        return None, None, "ERROR"
+        # Keep whatever the text layer already gave us
+        return digital if digital else (None, None, "ERROR")
 
-def find_answer_by_marker(full_text, marker_text, next_marker=None):
-    """Extract answer text between marker and next marker"""
-    try:
-        # Try multiple marker variations for better matching
-        marker_variations = [
-            marker_text,
-            marker_text.replace(' ', '\s+'),  # Allow multiple spaces
-            marker_text.replace(' ', '.*?'),    # Allow any chars between words
-        ]
-        
-        match = None
-        for marker_var in marker_variations:
-            pattern = re.escape(marker_var) if marker_var == marker_text else marker_var
-            match = re.search(pattern, full_text, re.IGNORECASE | re.DOTALL)
-            if match:
-                break
+# Allow multiple spaces - tried only when the exact marker isn't found
+_MARKER_RES = {
+    q_key: re.compile(r'\s+'.join(map(re.escape, cfg['marker_text'].split())),
+                      re.IGNORECASE | re.DOTALL)
+    for q_key, cfg in EXAM_QUESTIONS.items()
+}
+
+# Every exact marker in one alternation, so a single pass finds them all
+_ALL_MARKERS_RE = re.compile(
+    '|'.join(f'(?P<{q_key}>{re.escape(cfg["marker_text"])})' for q_key, cfg in EXAM_QUESTIONS.items()),
+    re.IGNORECASE | re.DOTALL
+)
+
+def fuzzy_find_marker(full_text, marker_text, pos=0):
+    """Best approximate marker match at or after pos -> (start, end, score), or None"""
+    text = full_text[pos:]
+    # partial_ratio aligns the shorter string inside the longer one
+    if len(text) < len(marker_text):
+        return None
+    res = fuzz.partial_ratio_alignment(marker_text.lower(), text.lower(),
+                                       score_cutoff=MARKER_FUZZY_MIN_SCORE)
+    if res is None:
+        return None
+    return pos + res.dest_start, pos + res.dest_end, res.score
+
+def find_answer_spans(full_text):
+    """Locate every question's answer as (start, end, marker_score), or None if missing.
+    
+    marker_score is 100 when the marker was matched by regex, otherwise the
+    RapidFuzz score of the approximate match.
+    """
+    # Exact marker hits for all questions in one pass
+    hits = {q_key: [] for q_key in EXAM_QUESTIONS}
+    for match in _ALL_MARKERS_RE.finditer(full_text):
+        hits[match.lastgroup].append((match.start(), match.end()))
+    
+    markers = list(EXAM_QUESTIONS.keys())
+    spans = {}
+    for i, q_key in enumerate(markers):
+        match = hits[q_key][0] + (100,) if hits[q_key] else None
         
-        if not match:
-            # Fallback: try finding key words from marker
-            key_words = marker_text.split()[:3]  # First 3 words
-            if len(key_words) >= 2:
-                fuzzy_pattern = '.*?'.join(re.escape(word) for word in key_words)
-                match = re.search(fuzzy_pattern, full_text, re.IGNORECASE | re.DOTALL)
+        if match is None:
+            found = _MARKER_RES[q_key].search(full_text)
+            if found:
+                match = (found.start(), found.end(), 100)
+            else:
+                # Fallback: approximate match for OCR-garbled markers
+                match = fuzzy_find_marker(full_text, EXAM_QUESTIONS[q_key]['marker_text'])
         
-        if not match:
-            return None
+        if match is None:
+            spans[q_key] = None
+            continue
         
-        start_pos = match.end()
+        start_pos = match[1]
         
         # Find end position
-        if next_marker:
-            next_variations = [
-                next_marker,
-                next_marker.split()[:3],  # First 3 words of next marker
-            ]
-            
-            end_pos = len(full_text)
-            for next_var in next_variations:
-                if isinstance(next_var, list):
-                    next_pattern = '.*?'.join(re.escape(word) for word in next_var)
-                else:
-                    next_pattern = re.escape(next_var)
-                
-                next_match = re.search(next_pattern, full_text[start_pos:], re.IGNORECASE | re.DOTALL)
-                if next_match:
-                    end_pos = start_pos + next_match.start()
-                    break
+        if i + 1 < len(markers):
+            next_q = markers[i + 1]
+            # Exact next marker first, then an approximate match
+            end_pos = next((start for start, _ in hits[next_q] if start >= start_pos), None)
+            if end_pos is None:
+                next_match = fuzzy_find_marker(full_text, EXAM_QUESTIONS[next_q]['marker_text'],
+                                               start_pos)
+                end_pos = next_match[0] if next_match else len(full_text)
         else:
             # For last question, take next 1000 chars max
             end_pos = min(start_pos + 1000, len(full_text))
         
-        answer = full_text[start_pos:end_pos].strip()
-        return answer if answer and len(answer) > 5 else None
-    except Exception as e:
-        return None
+        spans[q_key] = (start_pos, end_pos, match[2])
+    return spans
+
+def _find_all_answers(full_text, spans=None):
+    """Extract every question's answer text (None if missing or near-empty)"""
+    if spans is None:
+        spans = find_answer_spans(full_text)
+    answers = {}
+    for q_key, span in spans.items():
+        answer = full_text[span[0]:span[1]].strip() if span else None
+        answers[q_key] = answer if answer and len(answer) > 5 else None
+    return answers
 
 def calculate_garbage_ratio(text):
     """Calculate ratio of garbage characters"""
     if not text:
         return 0
-    garbage_count = sum(1 for char in text if char in GARBAGE_CHARS)
+    # Deleting garbage chars in C is far cheaper than a per-character Python loop
+    garbage_count = len(text) - len(text.translate(_GARBAGE_TRANS))
     return garbage_count / len(text)
 
-def assess_ocr_quality(answer_text, min_length):
+def assess_ocr_quality(answer_text, min_length, mean_conf=None):
     """Determine OCR quality status"""
     if answer_text is None:
         return "UNREADABLE", "MISSING_TEXT"
@@ -178,12 +778,38 @@ def assess_ocr_quality(answer_text, min_length):
     if len(answer_text) < min_length:
         return "TOO_SHORT", "LENGTH_CHECK"
     
+    # Tesseract's own word confidence is the primary signal when the text was OCR'd
+    if mean_conf is not None:
+        if mean_conf < OCR_MIN_CONF:
+            return "SUSPECT_OCR", "LOW_CONF"
+        return "OK", "PASS"
+    
+    # No confidence (born-digital text) - fall back to the garbage heuristic
     garbage_ratio = calculate_garbage_ratio(answer_text)
     if garbage_ratio > GARBAGE_THRESHOLD:
         return "SUSPECT_OCR", "HIGH_GARBAGE"
     
     return "OK", "PASS"
 
+def assess_answers(full_text, page_confs):
+    """Extract every answer and assess its OCR quality -> (spans, answers, quality)"""
+    spans = find_answer_spans(full_text)
+    answers = _find_all_answers(full_text, spans)
+    quality = {
+        q_key: assess_ocr_quality(answers[q_key], EXAM_QUESTIONS[q_key]['min_length'],
+                                  mean_confidence(full_text, page_confs, spans[q_key]))
+        for q_key in EXAM_QUESTIONS
+    }
+    return spans, answers, quality
+
+def suspect_pages(full_text, spans, quality):
+    """1-based pages behind SUSPECT_OCR answers, to be rescanned at OCR_RETRY_DPI"""
+    pages = set()
+    for q_key, (ocr_status, _) in quality.items():
+        if ocr_status == "SUSPECT_OCR":
+            pages |= find_answer_pages(full_text, spans[q_key])
+    return pages
+
 def dummy_grade(answer_text, max_marks, ocr_status):
     """Rule-based grading (LLM-ready structure)"""
     if ocr_status == "UNREADABLE":
@@ -209,51 +835,62 @@ def dummy_grade(answer_text, max_marks, ocr_status):
 # MAIN PROCESSING FUNCTION
 # ===========================
 
-def process_single_script(pdf_file):
-    """Process one PDF script and return results dict"""
-    result = {
-        'script_name': pdf_file.name,
-        'name_raw': None,
-        'reg_raw': None,
-        'name_clean': None,
-        'reg_clean': None,
-        'id_status': None,
-        'script_status': None,
-        'total_score': 0
-    }
+def process_single_script(script_name, pdf_bytes, page_workers=OCR_MAX_WORKERS):
+    """Process one PDF script and return its ScriptResult"""
+    result = ScriptResult(script_name=script_name)
     
-    # Read PDF
-    pdf_bytes = pdf_file.read()
-    full_text, first_page = extract_text_from_pdf(pdf_bytes)
+    # OCR PDF
+    pdf_hash = content_hash(pdf_bytes)
+    full_text, first_page_jpeg, header_data, page_confs = ocr_pdf(pdf_hash, pdf_bytes, page_workers)
     
     if full_text is None:
-        result['script_status'] = "PDF_ERROR"
+        result.script_status = "PDF_ERROR"
         return result
     
     # Extract name and registration
-    name, reg, id_status = extract_name_reg_from_top(first_page)
-    result['name_raw'] = name
-    result['reg_raw'] = reg
-    result['name_clean'] = name if name else "UNKNOWN"
-    result['reg_clean'] = reg if reg else "UNKNOWN"
-    result['id_status'] = id_status
+    name, reg, status = extract_name_reg_from_top(first_page_jpeg, extract_digital_header(pdf_bytes),
+                                                  header_data)
+    result.name_raw = name
+    result.reg_raw = reg
+    result.name_clean = name if name else "UNKNOWN"
+    result.reg_clean = reg if reg else "UNKNOWN"
+    result.id_status = status
     
     # Get marker texts in order
     markers = list(EXAM_QUESTIONS.keys())
     
+    # Extract answers and assess quality
+    spans, answers, quality = assess_answers(full_text, page_confs)
+    
+    # Rescan only the pages behind suspect answers at a higher DPI
+    suspect = [q for q in markers if quality[q][0] == "SUSPECT_OCR"]
+    if suspect:
+        pages = suspect_pages(full_text, spans, quality)
+        # page_confs belongs to the shared cache entry; rescans update a copy
+        page_confs = dict(page_confs)
+        full_text = rescan_pages(pdf_hash, pdf_bytes, full_text, pages, page_confs)
+        
+        rescanned_spans = find_answer_spans(full_text)
+        rescanned = _find_all_answers(full_text, rescanned_spans)
+        for q_key in suspect:
+            if rescanned[q_key] is not None:
+                spans[q_key] = rescanned_spans[q_key]
+                answers[q_key] = rescanned[q_key]
+                quality[q_key] = assess_ocr_quality(answers[q_key], EXAM_QUESTIONS[q_key]['min_length'],
+                                                    mean_confidence(full_text, page_confs, spans[q_key]))
+    
     # Process each question
     all_unreadable = True
     some_readable = False
     
-    for i, q_key in enumerate(markers):
+    for q_key in markers:
         q_config = EXAM_QUESTIONS[q_key]
-        next_marker = EXAM_QUESTIONS[markers[i+1]]['marker_text'] if i+1 < len(markers) else None
+        answer_text = answers[q_key]
+        ocr_status, ocr_flag = quality[q_key]
         
-        # Extract answer
-        answer_text = find_answer_by_marker(full_text, q_config['marker_text'], next_marker)
-        
-        # Assess quality
-        ocr_status, ocr_flag = assess_ocr_quality(answer_text, q_config['min_length'])
+        # Note answers whose marker was only matched approximately
+        if ocr_status == "OK" and spans[q_key][2] < 100:
+            ocr_flag = "FUZZY_MARKER"
         
         # Grade
         ai_score, ai_status = dummy_grade(answer_text, q_config['marks'], ocr_status)
@@ -267,85 +904,148 @@ def process_single_script(pdf_file):
             all_unreadable = False
         
         # Store results
-        result[f'{q_key}_final_score'] = final_score if final_score else ""
-        result[f'{q_key}_ai_score'] = ai_score if ai_score else ""
-        result[f'{q_key}_ocr_status'] = ocr_status
-        result[f'{q_key}_ocr_flag'] = ocr_flag
-        result[f'{q_key}_ai_status'] = ai_status
-        result[f'{q_key}_ai_flag'] = "NEEDS_REVIEW" if ocr_status != "OK" else "OK"
+        result.questions[q_key] = QuestionResult(
+            final_score=final_score if final_score else None,
+            ai_score=ai_score if ai_score else None,
+            ocr_status=ocr_status,
+            ocr_flag=ocr_flag,
+            ai_status=ai_status,
+            ai_flag="NEEDS_REVIEW" if ocr_status != "OK" else "OK",
+        )
         
         # Add to total
         if final_score:
-            result['total_score'] += final_score
+            result.total_score += final_score
     
     # Determine overall script status
     if all_unreadable:
-        result['script_status'] = "FULL_MANUAL"
+        result.script_status = "FULL_MANUAL"
     elif not some_readable:
-        result['script_status'] = "FULL_MANUAL"
-    elif any(result.get(f'{q}_ocr_status') in ['UNREADABLE', 'TOO_SHORT', 'SUSPECT_OCR'] 
+        result.script_status = "FULL_MANUAL"
+    elif any(result.questions[q].ocr_status in ['UNREADABLE', 'TOO_SHORT', 'SUSPECT_OCR']
              for q in markers):
-        result['script_status'] = "PARTIAL_MANUAL"
+        result.script_status = "PARTIAL_MANUAL"
     else:
-        result['script_status'] = "AUTO_COMPLETE"
+        result.script_status = "AUTO_COMPLETE"
     
-    result['total_score'] = round(result['total_score'], 1)
+    result.total_score = round(result.total_score, 1)
     
     return result
 
-def generate_excel(results_list):
-    """Generate Excel file with marksheet and review list"""
-    df = pd.DataFrame(results_list)
+def _ocr_script(pdf_bytes, page_workers):
+    """OCR a script plus the rescans its suspect answers will need (process pool worker).
+    
+    Returns (ocr_result, {page_num: rescan_result}) for the caller to cache.
+    """
+    result = extract_text_from_pdf(pdf_bytes, max_workers=page_workers)
+    full_text, _, _, page_confs = result
+    rescans = {}
+    if full_text is not None:
+        spans, _, quality = assess_answers(full_text, page_confs)
+        for page_num in sorted(suspect_pages(full_text, spans, quality) & page_confs.keys()):
+            rescans[page_num] = ocr_retry_page(pdf_bytes, page_num)
+    return result, rescans
+
+def process_all_scripts(scripts, on_progress=None, max_workers=OCR_MAX_WORKERS):
+    """Process (script_name, pdf_bytes) pairs, OCR'ing uncached PDFs in worker processes.
+    
+    Results come back in input order; on_progress(done, total) is called as
+    each script finishes.
+    """
+    results = [None] * len(scripts)
+    hashes = [content_hash(pdf_bytes) for _, pdf_bytes in scripts]
+    misses = {idx for idx, pdf_hash in enumerate(hashes) if cache_lookup(pdf_hash) is None}
+    workers = min(max_workers, len(misses))
+    done = 0
     
-    # Reorder columns
-    base_cols = ['script_name', 'name_raw', 'reg_raw', 'name_clean', 'reg_clean', 
-                 'id_status', 'script_status']
+    # Cached scripts (and every script when there's no pool) are finished right here
+    for idx, (script_name, pdf_bytes) in enumerate(scripts):
+        if workers <= 1 or idx not in misses:
+            results[idx] = process_single_script(script_name, pdf_bytes)
+            done += 1
+            if on_progress:
+                on_progress(done, len(scripts))
+    if workers <= 1:
+        return results
     
-    q_cols = []
+    # Workers only run the OCR (and rescans): caches filled inside them would vanish with
+    # the pool, so each result is cached in this process before its script is finished.
+    # Scripts take the cores first; pages only get their own pool from what's left over.
+    page_workers = max(1, max_workers // len(misses))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_ocr_script, scripts[idx][1], page_workers): idx
+            for idx in sorted(misses)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            script_name, pdf_bytes = scripts[idx]
+            try:
+                ocr_result, rescans = future.result()
+            except Exception as e:
+                # e.g. BrokenProcessPool when a worker is killed for memory
+                ocr_result, rescans = (None, None, None, None), {}
+            
+            if ocr_result[0] is None:
+                # Not cached, so the next run retries it
+                results[idx] = ScriptResult(script_name=script_name, script_status="PDF_ERROR")
+            else:
+                cache_store(hashes[idx], ocr_result)
+                for page_num, rescan in rescans.items():
+                    cache_store((hashes[idx], page_num), rescan)
+                results[idx] = process_single_script(script_name, pdf_bytes)
+            done += 1
+            if on_progress:
+                on_progress(done, len(scripts))
+    return results
+
+def write_sheet(workbook, sheet_name, columns, header_format=None):
+    """Write a {header: values} table to a new worksheet, strictly row by row.
+    
+    constant_memory workbooks flush each row as soon as the next one starts,
+    so cells must never be written column-wise (as DataFrame.to_excel does).
+    """
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, list(columns), header_format)
+    for row_idx, row in enumerate(zip(*columns.values()), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    return worksheet
+
+def generate_excel(results_cols):
+    """Generate Excel file with marksheet and review list from results_to_columns() output"""
+    # Columns are already in MARKSHEET_COLUMNS order - no per-row inference or reindex
+    df = pd.DataFrame(results_cols)
+    
+    # Create review list - every check is a column mask, each adds "<issue>; " where it hits
+    def issue(mask, label):
+        return pd.Series(np.where(mask, label + '; ', ''), index=df.index)
+    
+    issues = issue(df['id_status'].isin(['NEEDS_MANUAL_FIX', 'PARTIAL']), 'Unreadable ID')
     for q in EXAM_QUESTIONS.keys():
-        q_cols.extend([
-            f'{q}_final_score', f'{q}_ai_score', f'{q}_ocr_status', 
-            f'{q}_ocr_flag', f'{q}_ai_status', f'{q}_ai_flag'
-        ])
-    
-    final_cols = base_cols + q_cols + ['total_score']
-    df = df[final_cols]
-    
-    # Create review list
-    review_list = []
-    for idx, row in df.iterrows():
-        issues = []
-        
-        if row['id_status'] in ['NEEDS_MANUAL_FIX', 'PARTIAL']:
-            issues.append('Unreadable ID')
-        
-        for q in EXAM_QUESTIONS.keys():
-            if row[f'{q}_ocr_status'] == 'UNREADABLE':
-                issues.append(f'{q}: Unreadable')
-            elif row[f'{q}_ocr_status'] == 'SUSPECT_OCR':
-                issues.append(f'{q}: Suspect OCR')
-            elif row[f'{q}_ocr_status'] == 'TOO_SHORT':
-                issues.append(f'{q}: Too Short')
-        
-        if not row['total_score'] or row['total_score'] == 0:
-            issues.append('Blank final score')
-        
-        if issues:
-            review_list.append({
-                'script_name': row['script_name'],
-                'student': f"{row['name_clean']} ({row['reg_clean']})",
-                'status': row['script_status'],
-                'issues': '; '.join(issues)
-            })
+        ocr_status = df[f'{q}_ocr_status']
+        issues += issue(ocr_status.eq('UNREADABLE'), f'{q}: Unreadable')
+        issues += issue(ocr_status.eq('SUSPECT_OCR'), f'{q}: Suspect OCR')
+        issues += issue(ocr_status.eq('TOO_SHORT'), f'{q}: Too Short')
+    issues += issue(df['total_score'].fillna(0).eq(0), 'Blank final score')
     
-    review_df = pd.DataFrame(review_list)
+    flagged = df[issues.str.len() > 0]
+    review_df = pd.DataFrame({
+        'script_name': flagged['script_name'],
+        'student': (flagged['name_clean'].fillna('UNKNOWN') + ' ('
+                    + flagged['reg_clean'].fillna('UNKNOWN') + ')'),
+        'status': flagged['script_status'],
+        'issues': issues[flagged.index].str.removesuffix('; '),
+    })
     
-    # Write to Excel
+    # Write to Excel - constant_memory streams rows to disk instead of holding the
+    # whole workbook (in_memory would switch that back off, so it's left unset)
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Marksheet', index=False)
-        if not review_df.empty:
-            review_df.to_excel(writer, sheet_name='Manual Review', index=False)
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True})
+    write_sheet(workbook, 'Marksheet', results_cols, header_format)
+    if not review_df.empty:
+        write_sheet(workbook, 'Manual Review', review_df.to_dict('list'), header_format)
+    workbook.close()
     
     output.seek(0)
     return output
@@ -402,14 +1102,24 @@ def main():
         # Process button
         if st.button("🚀 Process Scripts", type="primary", use_container_width=True):
             with st.spinner("Processing exam scripts... This may take a few minutes."):
-                results = []
                 progress_bar = st.progress(0)
                 
-                for idx, pdf_file in enumerate(uploaded_files):
-                    st.text(f"Processing: {pdf_file.name}")
-                    result = process_single_script(pdf_file)
-                    results.append(result)
-                    progress_bar.progress((idx + 1) / len(uploaded_files))
+                # Upload objects can't be pickled - hand the worker pool plain bytes.
+                # Scripts already processed this session are reused as-is.
+                scripts = [(pdf_file.name, pdf_file.getvalue()) for pdf_file in uploaded_files]
+                keys = [(name, content_hash(pdf_bytes)) for name, pdf_bytes in scripts]
+                processed = st.session_state.setdefault('processed_scripts', {})
+                pending = [idx for idx, key in enumerate(keys) if key not in processed]
+                
+                def on_progress(done, total):
+                    progress_bar.progress((len(scripts) - total + done) / len(scripts))
+                
+                new_results = process_all_scripts([scripts[idx] for idx in pending], on_progress)
+                fresh = dict(zip((keys[idx] for idx in pending), new_results))
+                # Failed scripts are not kept, so the next click retries them
+                processed.update((key, r) for key, r in fresh.items() if r.script_status != "PDF_ERROR")
+                progress_bar.progress(1.0)
+                results = [processed.get(key) or fresh[key] for key in keys]
                 
                 # Store results in session state
                 st.session_state['results'] = results
@@ -426,9 +1136,9 @@ def main():
         col1, col2, col3, col4 = st.columns(4)
         
         total_scripts = len(results)
-        auto_complete = sum(1 for r in results if r['script_status'] == 'AUTO_COMPLETE')
-        partial_manual = sum(1 for r in results if r['script_status'] == 'PARTIAL_MANUAL')
-        full_manual = sum(1 for r in results if r['script_status'] == 'FULL_MANUAL')
+        auto_complete = sum(1 for r in results if r.script_status == 'AUTO_COMPLETE')
+        partial_manual = sum(1 for r in results if r.script_status == 'PARTIAL_MANUAL')
+        full_manual = sum(1 for r in results if r.script_status == 'FULL_MANUAL')
         
         col1.metric("Total Scripts", total_scripts)
         col2.metric("Auto-Complete", auto_complete, delta_color="normal")
@@ -437,27 +1147,28 @@ def main():
         
         # Preview table
         st.subheader("Marksheet Preview")
-        preview_df = pd.DataFrame(results)
+        results_cols = results_to_columns(results)
         display_cols = ['script_name', 'name_clean', 'reg_clean', 
                         'Q1_final_score', 'Q2_final_score', 'Q3_final_score', 
                         'total_score', 'script_status']
         
-        if all(col in preview_df.columns for col in display_cols):
-            st.dataframe(preview_df[display_cols], use_container_width=True)
+        if all(col in results_cols for col in display_cols):
+            preview_df = pd.DataFrame({col: results_cols[col] for col in display_cols})
+            st.dataframe(preview_df, use_container_width=True)
         
         # Manual review list
-        review_needed = [r for r in results if r['script_status'] != 'AUTO_COMPLETE']
+        review_needed = [r for r in results if r.script_status != 'AUTO_COMPLETE']
         if review_needed:
             st.warning(f"⚠️ {len(review_needed)} script(s) need manual review")
             with st.expander("Scripts Requiring Manual Review"):
                 for r in review_needed:
-                    st.text(f"• {r['script_name']} - {r['name_clean']} ({r['reg_clean']}) - Status: {r['script_status']}")
+                    st.text(f"• {r.script_name} - {r.name_clean} ({r.reg_clean}) - Status: {r.script_status}")
         else:
             st.success("✅ All scripts auto-graded successfully!")
         
         # Download button
         st.markdown("---")
-        excel_file = generate_excel(results)
+        excel_file = generate_excel(results_cols)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         st.download_button(